@@ -4,7 +4,10 @@ FastAPI Backend for Elevator Simulation
 This module provides a REST API and WebSocket server for the elevator simulation system.
 """
 import asyncio
-import json
+import os
+import msgpack
+import msgspec
+import orjson
 import uvicorn
 from fastapi import (
     FastAPI,
@@ -12,20 +15,54 @@ from fastapi import (
     WebSocketDisconnect,
     HTTPException,
     BackgroundTasks,
+    Depends,
+    Request,
+    Response,
 )
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict, List, Any, Optional
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+from typing import Callable, Dict, List, Any, Optional, Set, Tuple, Union
+from pydantic import BaseModel, ConfigDict
 
 from simulation.elevator_simulation import ElevatorSystem, PassengerGenerator, Direction
 
+# Maximum number of HTTP requests handled at the same time
+MAX_CONCURRENT_REQUESTS = 1000
+
+
+class ConnectionLimitMiddleware(BaseHTTPMiddleware):
+    """Reject HTTP requests with 503 when too many are already in progress."""
+
+    def __init__(self, app, max_concurrent: int, exempt_paths=("/", "/health")):
+        super().__init__(app)
+        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.exempt_paths = set(exempt_paths)
+
+    async def dispatch(self, request: Request, call_next):
+        if request.url.path in self.exempt_paths:
+            return await call_next(request)
+
+        # Fail fast instead of queueing requests that would only time out
+        if self.semaphore.locked():
+            return Response(status_code=503, headers={"Retry-After": "1"})
+
+        async with self.semaphore:
+            return await call_next(request)
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Elevator Simulation API",
     description="REST API for an elevator simulation system",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
 )
 
+# Limit concurrent requests (added before CORS so rejections still get CORS headers)
+app.add_middleware(ConnectionLimitMiddleware, max_concurrent=MAX_CONCURRENT_REQUESTS)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -35,58 +72,300 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Maximum number of concurrent WebSocket clients
+MAX_WS_CONNECTIONS = 500
+
+# Maximum number of outgoing messages queued per WebSocket client
+CLIENT_QUEUE_SIZE = 8
+
+# Messages superseded by a full state snapshot
+STATE_MESSAGE_TYPES = {"state_update", "state_delta"}
+
 # Global simulation objects
 elevator_system = ElevatorSystem(num_elevators=6, num_floors=25, time_scale=1.0)
 passenger_generator = PassengerGenerator(elevator_system)
 
 
+def encode_message(
+    message: Dict[str, Any], binary: bool = True
+) -> Union[bytes, str]:
+    """Serialize a WebSocket message to MessagePack bytes, or to JSON text."""
+    if binary:
+        return msgpack.packb(message, use_bin_type=True)
+    return orjson.dumps(message, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+class EncodedMessage:
+    """A WebSocket message, serialized at most once per wire format."""
+
+    def __init__(self, message: Dict[str, Any]):
+        self.message = message
+        self.is_state = message["type"] in STATE_MESSAGE_TYPES
+        self.payloads: Dict[bool, Union[bytes, str]] = {}
+
+    def payload(self, binary: bool) -> Union[bytes, str]:
+        if binary not in self.payloads:
+            self.payloads[binary] = encode_message(self.message, binary)
+        return self.payloads[binary]
+
+
+def not_modified(request: Request, response: Response, etag: str) -> bool:
+    """Set caching headers and check whether the client's copy is current."""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return request.headers.get("if-none-match") == etag
+
+
+def diff_state(previous: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+    """Get the fields of the system state that changed since the previous snapshot.
+
+    Top-level fields are replaced as a whole, except for elevators, which are
+    sent as a mapping of elevator index (as a string, so the message has only
+    string map keys) to the updated elevator.
+    """
+    delta = {}
+    for key, value in current.items():
+        if key == "elevators":
+            changed = {
+                str(index): elevator
+                for index, (old, elevator) in enumerate(
+                    zip(previous["elevators"], value)
+                )
+                if old is not elevator and old != elevator
+            }
+            if changed:
+                delta["elevators"] = changed
+        elif previous.get(key) != value:
+            delta[key] = value
+    return delta
+
+
 # WebSocket connection manager
 class ConnectionManager:
     def __init__(self):
         self.active_connections: List[WebSocket] = []
+        # Outgoing messages per client, drained by a dedicated writer task so
+        # a slow client cannot hold up the others
+        self.queues: Dict[WebSocket, asyncio.Queue] = {}
+        self.writers: Dict[WebSocket, asyncio.Task] = {}
+        # Clients that dropped a message and need a full state snapshot
+        self.stale_connections: Set[WebSocket] = set()
+        # Clients that asked for JSON text frames instead of MessagePack
+        self.json_connections: Set[WebSocket] = set()
+        self.last_state: Optional[Dict[str, Any]] = None
+
+    async def connect(self, websocket: WebSocket) -> bool:
+        # Reject new clients when at capacity (1013: try again later)
+        if len(self.active_connections) >= MAX_WS_CONNECTIONS:
+            await websocket.close(code=1013)
+            return False
 
-    async def connect(self, websocket: WebSocket):
         await websocket.accept()
         self.active_connections.append(websocket)
+        if websocket.query_params.get("format") == "json":
+            self.json_connections.add(websocket)
+        queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        self.queues[websocket] = queue
+        self.writers[websocket] = asyncio.create_task(self._write(websocket, queue))
+        return True
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        if websocket in self.active_connections:
+            self.active_connections.remove(websocket)
+        self.queues.pop(websocket, None)
+        self.stale_connections.discard(websocket)
+        self.json_connections.discard(websocket)
+
+        writer = self.writers.pop(websocket, None)
+        if writer is not None and writer is not asyncio.current_task():
+            writer.cancel()
+
+    async def _write(self, websocket: WebSocket, queue: asyncio.Queue):
+        binary = websocket not in self.json_connections
+        try:
+            while True:
+                message = await queue.get()
+                payload = message.payload(binary)
+                if binary:
+                    await websocket.send_bytes(payload)
+                else:
+                    await websocket.send_text(payload)
+        except Exception:
+            # Connection is closed or invalid
+            self.disconnect(websocket)
+
+    @staticmethod
+    def _drop_state_messages(queue: asyncio.Queue):
+        """Remove queued state messages, keeping replies to client commands."""
+        kept = []
+        while not queue.empty():
+            message = queue.get_nowait()
+            if not message.is_state:
+                kept.append(message)
+        for message in kept:
+            queue.put_nowait(message)
+
+    def _enqueue(self, websocket: WebSocket, message: EncodedMessage):
+        queue = self.queues.get(websocket)
+        if queue is None:
+            return
+
+        if queue.full():
+            # Drop queued state messages, or the oldest message if there are
+            # none; the client gets a full snapshot with the next broadcast
+            self._drop_state_messages(queue)
+            if queue.full():
+                queue.get_nowait()
+            self.stale_connections.add(websocket)
+        queue.put_nowait(message)
+
+    def send(self, websocket: WebSocket, message: Dict[str, Any]):
+        self._enqueue(websocket, EncodedMessage(message))
+
+    def send_state(self, websocket: WebSocket, state: Dict[str, Any]):
+        # The snapshot can be newer than last_state, which the next delta is
+        # computed against, so the client gets a full snapshot with the next
+        # broadcast too
+        self.send(websocket, {"type": "state_update", "data": state})
+        self.stale_connections.add(websocket)
+
+    def broadcast(self, message: Dict[str, Any]):
+        # Serialize once per wire format for all clients
+        encoded = EncodedMessage(message)
+        for connection in self.active_connections:
+            self._enqueue(connection, encoded)
+
+    def broadcast_state(self, state: Dict[str, Any]):
+        # Send only what changed since the last broadcast; clients receive a
+        # full snapshot when they connect, request one or fall behind
+        previous = self.last_state
+        self.last_state = state
+
+        if previous is None or len(previous["elevators"]) != len(state["elevators"]):
+            self.stale_connections.clear()
+            self.broadcast({"type": "state_update", "data": state})
+            return
+
+        delta = diff_state(previous, state)
+        delta_message = (
+            EncodedMessage({"type": "state_delta", "data": delta}) if delta else None
+        )
+        snapshot_message = EncodedMessage({"type": "state_update", "data": state})
 
-    async def broadcast(self, message: Dict[str, Any]):
+        stale_connections = self.stale_connections
+        self.stale_connections = set()
         for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except Exception:
-                # Connection might be closed or invalid
-                pass
+            if connection in stale_connections:
+                # Queued state messages are superseded by the snapshot
+                self._drop_state_messages(self.queues[connection])
+                self._enqueue(connection, snapshot_message)
+            elif delta_message is not None:
+                self._enqueue(connection, delta_message)
 
 
 manager = ConnectionManager()
 
-# Tasks and loops
-simulation_task = None
-generator_task = None
-broadcast_task = None
+# Task running the simulation, passenger generator and state broadcaster
+simulation_tasks: Optional[asyncio.Task] = None
+# Serializes starting, stopping and reconfiguring the simulation
+lifecycle_lock = asyncio.Lock()
 
 
 # Models for API endpoints
 class SimulationConfig(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     num_elevators: Optional[int] = 6
     num_floors: Optional[int] = 25
     time_scale: Optional[float] = 1.0
     passenger_rate: Optional[float] = 1.0
 
 
-class PassengerRequest(BaseModel):
+# Small, high-rate request bodies are decoded with msgspec, which builds the
+# struct directly from the JSON bytes
+class PassengerRequest(msgspec.Struct, frozen=True):
     start_floor: int
     destination_floor: int
 
 
-class ButtonPress(BaseModel):
+class ButtonPress(msgspec.Struct, frozen=True):
     floor: int
     direction: str  # "up" or "down"
 
 
+def json_body(model: type):
+    """Dependency that decodes the JSON request body into a msgspec struct.
+
+    Decoding is lax like pydantic's, so numeric strings and integral floats
+    are accepted for int fields, and errors are reported in the same 422
+    format as pydantic validation errors.
+    """
+    decoder = msgspec.json.Decoder(model, strict=False)
+
+    async def decode_body(request: Request):
+        try:
+            return decoder.decode(await request.body())
+        except msgspec.ValidationError as e:
+            # Messages end with the path of the invalid field, e.g.
+            # "Expected `int`, got `str` - at `$.floor`"
+            message, _, path = str(e).partition(" - at `$")
+            loc = ("body", *filter(None, path.strip("`").split(".")))
+            raise RequestValidationError(
+                [{"type": "value_error", "loc": loc, "msg": message, "input": None}]
+            )
+        except msgspec.DecodeError as e:
+            raise RequestValidationError(
+                [
+                    {
+                        "type": "json_invalid",
+                        "loc": ("body",),
+                        "msg": str(e),
+                        "input": None,
+                    }
+                ]
+            )
+
+    return decode_body
+
+
+# A step holds the simulation lock for its whole duration (a whole batch in
+# fast mode), so request handlers wait for it on a worker thread rather than
+# stalling the event loop
+async def run_locked(func: Callable[[], Any]) -> Any:
+    """Call func with the simulation lock held, on a worker thread."""
+    lock = elevator_system.lock
+
+    def call():
+        with lock:
+            return func()
+
+    return await asyncio.to_thread(call)
+
+
+async def run_versioned(
+    request: Request, build: Callable[[], Any]
+) -> Tuple[int, Any]:
+    """Get the state version and, unless the client's copy is current, build().
+
+    Both are read under the same lock, so the body matches the version. The
+    body is None when the request's If-None-Match names the current version.
+    """
+    client_etag = request.headers.get("if-none-match")
+
+    def snapshot():
+        version = elevator_system.state_version
+        if client_etag == f'W/"{version}"':
+            return version, None
+        return version, build()
+
+    return await run_locked(snapshot)
+
+
+async def get_system_state() -> Dict[str, Any]:
+    """Get the cached system state without blocking the event loop."""
+    return await asyncio.to_thread(elevator_system.get_system_state_cached)
+
+
 # Background tasks for simulation
 async def run_simulation():
     await elevator_system.run_simulation()
@@ -97,29 +376,51 @@ async def run_passenger_generator(rate: float = 1.0):
 
 
 async def broadcast_state():
+    loop = asyncio.get_running_loop()
     while True:
+        # Wait until the simulation state changes
+        await elevator_system.state_changed.wait()
+        elevator_system.state_changed.clear()
+        started = loop.time()
+
         if elevator_system.running:
-            state = elevator_system.get_system_state()
-            await manager.broadcast({"type": "state_update", "data": state})
-        await asyncio.sleep(0.2)  # Send updates 5 times per second
+            state = await get_system_state()
+            manager.broadcast_state(state)
+
+        # Send at most 5 updates per second
+        await asyncio.sleep(max(0, 0.2 - (loop.time() - started)))
+
+
+async def run_all_tasks(passenger_rate: float = 1.0):
+    # If any task fails, the group cancels the others
+    async with asyncio.TaskGroup() as task_group:
+        task_group.create_task(run_simulation())
+        task_group.create_task(run_passenger_generator(passenger_rate))
+        task_group.create_task(broadcast_state())
+
+
+# Helper to cancel the running tasks and wait until they have finished. The
+# simulation task waits for any step in progress on its worker thread, so no
+# step of an old simulation can still run after this returns
+async def cancel_all_tasks():
+    global simulation_tasks
+
+    if simulation_tasks:
+        simulation_tasks.cancel()
+        await asyncio.gather(simulation_tasks, return_exceptions=True)
+        simulation_tasks = None
 
 
 # Helper to start all tasks
 async def start_all_tasks(passenger_rate: float = 1.0):
-    global simulation_task, generator_task, broadcast_task
+    global simulation_tasks
 
-    # Cancel existing tasks if they're running
-    if simulation_task:
-        simulation_task.cancel()
-    if generator_task:
-        generator_task.cancel()
-    if broadcast_task:
-        broadcast_task.cancel()
+    async with lifecycle_lock:
+        # Cancel existing tasks if they're running
+        await cancel_all_tasks()
 
-    # Create new tasks
-    simulation_task = asyncio.create_task(run_simulation())
-    generator_task = asyncio.create_task(run_passenger_generator(passenger_rate))
-    broadcast_task = asyncio.create_task(broadcast_state())
+        # Create new tasks
+        simulation_tasks = asyncio.create_task(run_all_tasks(passenger_rate))
 
 
 # API endpoints
@@ -128,18 +429,21 @@ async def root():
     return {"message": "Elevator Simulation API"}
 
 
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
 @app.get("/status")
 async def get_status():
+    state = await get_system_state()
     return {
         "running": elevator_system.running,
-        "time": elevator_system.simulation_time,
-        "elevators": len(elevator_system.elevators),
+        "time": state["time"],
+        "elevators": len(state["elevators"]),
         "floors": elevator_system.num_floors,
-        "waiting_passengers": sum(
-            len(passengers)
-            for passengers in elevator_system.waiting_passengers.values()
-        ),
-        "completed_trips": len(elevator_system.completed_passengers),
+        "waiting_passengers": elevator_system.waiting_count,
+        "completed_trips": state["completed_trips"],
     }
 
 
@@ -147,230 +451,224 @@ async def get_status():
 async def start_simulation(config: SimulationConfig, background_tasks: BackgroundTasks):
     global elevator_system, passenger_generator
 
-    if elevator_system.running:
-        return {"message": "Simulation is already running"}
-
-    # Reset or create new simulation with config
-    if (
-        config.num_elevators != elevator_system.num_elevators
-        or config.num_floors != elevator_system.num_floors
-    ):
-        elevator_system = ElevatorSystem(
-            num_elevators=config.num_elevators,
-            num_floors=config.num_floors,
-            time_scale=config.time_scale,
-        )
-        passenger_generator = PassengerGenerator(elevator_system)
-    else:
-        elevator_system.time_scale = config.time_scale
-        elevator_system.reset()
-
-    # Start tasks
-    background_tasks.add_task(start_all_tasks, config.passenger_rate)
+    async with lifecycle_lock:
+        if elevator_system.running:
+            return {"message": "Simulation is already running"}
+
+        # Reset or create new simulation with config
+        if (
+            config.num_elevators != elevator_system.num_elevators
+            or config.num_floors != elevator_system.num_floors
+        ):
+            elevator_system = ElevatorSystem(
+                num_elevators=config.num_elevators,
+                num_floors=config.num_floors,
+                time_scale=config.time_scale,
+            )
+            passenger_generator = PassengerGenerator(elevator_system)
+        else:
+            elevator_system.time_scale = config.time_scale
+            elevator_system.reset()
+
+        # Start tasks
+        background_tasks.add_task(start_all_tasks, config.passenger_rate)
 
-    return {"message": "Simulation started", "config": config.dict()}
+        return {"message": "Simulation started", "config": config.model_dump()}
 
 
 @app.post("/stop")
 async def stop_simulation():
-    if not elevator_system.running:
-        return {"message": "Simulation is not running"}
+    async with lifecycle_lock:
+        if not elevator_system.running:
+            return {"message": "Simulation is not running"}
 
-    elevator_system.stop_simulation()
-    passenger_generator.stop_generation()
+        elevator_system.stop_simulation()
+        passenger_generator.stop_generation()
 
-    # Cancel tasks
-    if simulation_task:
-        simulation_task.cancel()
-    if generator_task:
-        generator_task.cancel()
+        # Cancel tasks
+        await cancel_all_tasks()
 
-    return {"message": "Simulation stopped"}
+        return {"message": "Simulation stopped"}
 
 
 @app.post("/reset")
 async def reset_simulation():
-    if elevator_system.running:
-        elevator_system.stop_simulation()
-        passenger_generator.stop_generation()
+    async with lifecycle_lock:
+        if elevator_system.running:
+            elevator_system.stop_simulation()
+            passenger_generator.stop_generation()
 
-        # Cancel tasks
-        if simulation_task:
-            simulation_task.cancel()
-        if generator_task:
-            generator_task.cancel()
+            # Cancel tasks
+            await cancel_all_tasks()
 
-    elevator_system.reset()
+        elevator_system.reset()
 
-    return {"message": "Simulation reset"}
+        return {"message": "Simulation reset"}
 
 
 @app.get("/state")
 async def get_state():
-    return elevator_system.get_system_state()
+    return await get_system_state()
 
 
 @app.get("/elevators")
-async def get_elevators():
-    return [elevator.to_dict() for elevator in elevator_system.elevators]
+async def get_elevators(request: Request, response: Response):
+    version, elevators = await run_versioned(request, elevator_system.elevator_dicts)
+    if not_modified(request, response, f'W/"{version}"'):
+        return Response(status_code=304, headers=response.headers)
+
+    return elevators
 
 
 @app.get("/elevators/{elevator_id}")
-async def get_elevator(elevator_id: int):
+async def get_elevator(elevator_id: int, request: Request, response: Response):
     if elevator_id < 0 or elevator_id >= len(elevator_system.elevators):
         raise HTTPException(status_code=404, detail="Elevator not found")
 
-    return elevator_system.elevators[elevator_id].to_dict()
+    elevator = elevator_system.elevators[elevator_id]
+    version, data = await run_versioned(request, elevator.to_dict)
+    if not_modified(request, response, f'W/"{version}"'):
+        return Response(status_code=304, headers=response.headers)
+
+    return data
 
 
 @app.get("/passengers/waiting")
 async def get_waiting_passengers():
-    return {
-        floor: [passenger.to_dict() for passenger in passengers]
-        for floor, passengers in elevator_system.waiting_passengers.items()
-        if passengers
-    }
+    def snapshot():
+        now = elevator_system.simulation_time
+        return {
+            floor: [passenger.to_dict(now) for passenger in passengers]
+            for floor, passengers in elevator_system.waiting_passengers.items()
+            if passengers
+        }
+
+    return await run_locked(snapshot)
 
 
 @app.get("/passengers/completed")
 async def get_completed_passengers():
-    return [passenger.to_dict() for passenger in elevator_system.completed_passengers]
+    def snapshot():
+        now = elevator_system.simulation_time
+        return [
+            passenger.to_dict(now)
+            for passenger in elevator_system.completed_passengers
+        ]
+
+    return await run_locked(snapshot)
 
 
 @app.get("/events")
 async def get_events(limit: int = 100, skip: int = 0):
     """Get recent simulation events with pagination."""
-    events = elevator_system.event_log
-    total = len(events)
+    def snapshot():
+        events = elevator_system.event_log
+        return len(events), events.recent(skip, limit)
 
-    # Sort events by time, newest first
-    sorted_events = sorted(events, key=lambda e: e["time"], reverse=True)
-
-    # Apply pagination
-    paginated_events = sorted_events[skip : skip + limit]
+    total, paginated_events = await run_locked(snapshot)
 
     return {"total": total, "skip": skip, "limit": limit, "events": paginated_events}
 
 
-@app.post("/passengers")
-async def add_passenger(request: PassengerRequest):
-    """Manually add a new passenger to the simulation."""
+def passenger_request_error(start_floor: Any, destination_floor: Any) -> Optional[str]:
+    """Check a request to add a passenger; return why it is invalid, if it is."""
     if not elevator_system.running:
-        raise HTTPException(status_code=400, detail="Simulation is not running")
+        return "Simulation is not running"
 
-    if request.start_floor == request.destination_floor:
-        raise HTTPException(
-            status_code=400, detail="Start and destination floors must be different"
-        )
+    if not all(
+        isinstance(floor, int) and not isinstance(floor, bool)
+        for floor in (start_floor, destination_floor)
+    ):
+        return "Start and destination floors must be integers"
 
-    if request.start_floor < 1 or request.start_floor > elevator_system.num_floors:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Start floor must be between 1 and {elevator_system.num_floors}",
-        )
+    if start_floor == destination_floor:
+        return "Start and destination floors must be different"
 
-    if (
-        request.destination_floor < 1
-        or request.destination_floor > elevator_system.num_floors
-    ):
-        raise HTTPException(
-            status_code=400,
-            detail=f"Destination floor must be between 1 and {elevator_system.num_floors}",
-        )
+    if start_floor < 1 or start_floor > elevator_system.num_floors:
+        return f"Start floor must be between 1 and {elevator_system.num_floors}"
 
-    passenger = elevator_system.add_passenger(
-        request.start_floor, request.destination_floor
-    )
+    if destination_floor < 1 or destination_floor > elevator_system.num_floors:
+        return f"Destination floor must be between 1 and {elevator_system.num_floors}"
 
-    return passenger.to_dict()
+    return None
 
 
-@app.post("/button")
-async def press_button(request: ButtonPress):
-    """Simulate pressing an elevator call button on a floor."""
+def button_press_error(floor: Any, direction: Any) -> Optional[str]:
+    """Check a call button press; return why it is invalid, if it is."""
     if not elevator_system.running:
-        raise HTTPException(status_code=400, detail="Simulation is not running")
+        return "Simulation is not running"
 
-    if request.floor < 1 or request.floor > elevator_system.num_floors:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Floor must be between 1 and {elevator_system.num_floors}",
-        )
+    if not isinstance(floor, int) or isinstance(floor, bool):
+        return "Floor must be an integer"
 
-    if request.direction.lower() not in ["up", "down"]:
-        raise HTTPException(status_code=400, detail="Direction must be 'up' or 'down'")
+    if floor < 1 or floor > elevator_system.num_floors:
+        return f"Floor must be between 1 and {elevator_system.num_floors}"
 
-    # Get direction enum
-    direction = Direction.UP if request.direction.lower() == "up" else Direction.DOWN
+    if not isinstance(direction, str) or direction.lower() not in ["up", "down"]:
+        return "Direction must be 'up' or 'down'"
 
-    # Register the request
-    if direction == Direction.UP:
-        elevator_system.up_requests.add(request.floor)
-    else:
-        elevator_system.down_requests.add(request.floor)
+    return None
 
-    # Assign an elevator
-    elevator_system.assign_elevator(request.floor, direction)
 
-    # Log the event
-    event = elevator_system.log_event(
-        "button_press", {"floor": request.floor, "direction": request.direction.lower()}
+@app.post("/passengers")
+async def add_passenger(
+    request: PassengerRequest = Depends(json_body(PassengerRequest)),
+):
+    """Manually add a new passenger to the simulation."""
+    error = passenger_request_error(request.start_floor, request.destination_floor)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+
+    passenger = await asyncio.to_thread(
+        elevator_system.add_passenger, request.start_floor, request.destination_floor
     )
 
-    return event
+    return passenger.to_dict(elevator_system.simulation_time)
+
+
+@app.post("/button")
+async def press_button(request: ButtonPress = Depends(json_body(ButtonPress))):
+    """Simulate pressing an elevator call button on a floor."""
+    error = button_press_error(request.floor, request.direction)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+
+    # Get direction enum
+    direction = Direction.UP if request.direction.lower() == "up" else Direction.DOWN
+
+    # Register the request and assign an elevator
+    return await asyncio.to_thread(
+        elevator_system.press_button, request.floor, direction
+    )
 
 
 @app.get("/stats")
 async def get_statistics():
     """Get various statistics about the simulation."""
-    if len(elevator_system.completed_passengers) == 0:
+    def snapshot():
         return {
-            "average_wait_time": 0,
-            "average_ride_time": 0,
-            "average_total_time": 0,
-            "total_completed_trips": 0,
-            "total_waiting_passengers": sum(
-                len(passengers)
-                for passengers in elevator_system.waiting_passengers.values()
-            ),
+            **elevator_system.trip_statistics(),
+            "total_completed_trips": elevator_system.completed_count,
+            "total_waiting_passengers": elevator_system.waiting_count,
             "elevator_utilization": {
                 elevator.id: len(elevator.passengers) / elevator.capacity
                 for elevator in elevator_system.elevators
             },
         }
 
-    # Calculate statistics from completed passengers
-    wait_times = [p.wait_time for p in elevator_system.completed_passengers]
-    ride_times = [
-        p.ride_time
-        for p in elevator_system.completed_passengers
-        if p.ride_time is not None
-    ]
-    total_times = [
-        p.total_time
-        for p in elevator_system.completed_passengers
-        if p.total_time is not None
-    ]
-
-    return {
-        "average_wait_time": sum(wait_times) / len(wait_times) if wait_times else 0,
-        "average_ride_time": sum(ride_times) / len(ride_times) if ride_times else 0,
-        "average_total_time": sum(total_times) / len(total_times) if total_times else 0,
-        "total_completed_trips": len(elevator_system.completed_passengers),
-        "total_waiting_passengers": sum(
-            len(passengers)
-            for passengers in elevator_system.waiting_passengers.values()
-        ),
-        "elevator_utilization": {
-            elevator.id: len(elevator.passengers) / elevator.capacity
-            for elevator in elevator_system.elevators
-        },
-    }
+    return await run_locked(snapshot)
 
 
 @app.get("/config")
-async def get_configuration():
+async def get_configuration(request: Request, response: Response):
     """Get current simulation configuration."""
+    etag = (
+        f'W/"{elevator_system.num_elevators}-{elevator_system.num_floors}'
+        f'-{elevator_system.time_scale}-{int(elevator_system.running)}"'
+    )
+    if not_modified(request, response, etag):
+        return Response(status_code=304, headers=response.headers)
+
     return {
         "num_elevators": elevator_system.num_elevators,
         "num_floors": elevator_system.num_floors,
@@ -384,101 +682,130 @@ async def update_configuration(
     config: SimulationConfig, background_tasks: BackgroundTasks
 ):
     """Update simulation configuration."""
-    if elevator_system.running:
-        # Stop the simulation first
-        elevator_system.stop_simulation()
-        passenger_generator.stop_generation()
+    async with lifecycle_lock:
+        if elevator_system.running:
+            # Stop the simulation first
+            elevator_system.stop_simulation()
+            passenger_generator.stop_generation()
 
-        # Cancel tasks
-        if simulation_task:
-            simulation_task.cancel()
-        if generator_task:
-            generator_task.cancel()
+            # Cancel tasks
+            await cancel_all_tasks()
 
-    # Update configuration
-    was_running = elevator_system.running
-    elevator_system.time_scale = config.time_scale
+        # Update configuration
+        was_running = elevator_system.running
+        elevator_system.time_scale = config.time_scale
 
-    # Restart if it was running
-    if was_running:
-        background_tasks.add_task(start_all_tasks, config.passenger_rate)
+        # Restart if it was running
+        if was_running:
+            background_tasks.add_task(start_all_tasks, config.passenger_rate)
 
-    return {
-        "message": "Configuration updated",
-        "config": {
-            "num_elevators": elevator_system.num_elevators,
-            "num_floors": elevator_system.num_floors,
-            "time_scale": elevator_system.time_scale,
+        return {
+            "message": "Configuration updated",
+            "config": {
+                "num_elevators": elevator_system.num_elevators,
+                "num_floors": elevator_system.num_floors,
+                "time_scale": elevator_system.time_scale,
+            },
+        }
+
+
+# WebSocket command handlers, keyed by the "command" field of client messages
+async def _h_get_state(websocket: WebSocket, data: Dict[str, Any]):
+    state = await get_system_state()
+    manager.send_state(websocket, state)
+
+
+def _send_error(websocket: WebSocket, message: str):
+    manager.send(websocket, {"type": "error", "data": {"message": message}})
+
+
+async def _h_add_passenger(websocket: WebSocket, data: Dict[str, Any]):
+    start_floor = data.get("start_floor")
+    destination_floor = data.get("destination_floor")
+
+    error = passenger_request_error(start_floor, destination_floor)
+    if error:
+        _send_error(websocket, error)
+        return
+
+    passenger = await asyncio.to_thread(
+        elevator_system.add_passenger, start_floor, destination_floor
+    )
+    data = passenger.to_dict(elevator_system.simulation_time)
+    manager.send(websocket, {"type": "passenger_added", "data": data})
+
+
+async def _h_press_button(websocket: WebSocket, data: Dict[str, Any]):
+    floor = data.get("floor")
+    direction = data.get("direction")
+
+    error = button_press_error(floor, direction)
+    if error:
+        _send_error(websocket, error)
+        return
+
+    dir_enum = Direction.UP if direction.lower() == "up" else Direction.DOWN
+    await asyncio.to_thread(elevator_system.press_button, floor, dir_enum)
+    manager.send(
+        websocket,
+        {
+            "type": "button_pressed",
+            "data": {"floor": floor, "direction": direction},
         },
-    }
+    )
+
+
+HANDLERS = {
+    "get_state": _h_get_state,
+    "add_passenger": _h_add_passenger,
+    "press_button": _h_press_button,
+}
 
 
 # WebSocket endpoint for real-time updates
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+    if not await manager.connect(websocket):
+        return
 
     try:
         # Send initial state
-        state = elevator_system.get_system_state()
-        await websocket.send_json({"type": "state_update", "data": state})
+        state = await get_system_state()
+        manager.send_state(websocket, state)
 
-        # Process messages from client
+        # Process messages from client; accept both text and binary frames
         while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+
+            raw = message.get("bytes")
+            if raw is None:
+                raw = message.get("text")
             try:
-                data = await websocket.receive_json()
-                # Handle WebSocket commands if needed
-                command = data.get("command")
-
-                if command == "get_state":
-                    state = elevator_system.get_system_state()
-                    await websocket.send_json({"type": "state_update", "data": state})
-
-                elif command == "add_passenger":
-                    start_floor = data.get("start_floor")
-                    destination_floor = data.get("destination_floor")
-
-                    if start_floor and destination_floor:
-                        passenger = elevator_system.add_passenger(
-                            start_floor, destination_floor
-                        )
-                        await websocket.send_json(
-                            {"type": "passenger_added", "data": passenger.to_dict()}
-                        )
-
-                elif command == "press_button":
-                    floor = data.get("floor")
-                    direction = data.get("direction")
-
-                    if floor and direction:
-                        dir_enum = (
-                            Direction.UP
-                            if direction.lower() == "up"
-                            else Direction.DOWN
-                        )
-
-                        if dir_enum == Direction.UP:
-                            elevator_system.up_requests.add(floor)
-                        else:
-                            elevator_system.down_requests.add(floor)
-
-                        elevator_system.assign_elevator(floor, dir_enum)
-
-                        await websocket.send_json(
-                            {
-                                "type": "button_pressed",
-                                "data": {"floor": floor, "direction": direction},
-                            }
-                        )
-
-            except json.JSONDecodeError:
+                data = orjson.loads(raw)
+            except (orjson.JSONDecodeError, TypeError):
                 # Handle invalid JSON
                 continue
+            if not isinstance(data, dict):
+                continue
+
+            handler = HANDLERS.get(data.get("command"))
+            if handler:
+                await handler(websocket, data)
 
     except WebSocketDisconnect:
         manager.disconnect(websocket)
 
 
-# Entry point
+# Entry point for local development; production runs under gunicorn (see worker.py)
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        ws="websockets",
+        reload=os.getenv("RELOAD", "false").lower() == "true",
+    )
@@ -5,15 +5,41 @@ This module implements the core simulation engine for an elevator scheduling sys
 with 6 elevators in a 25-floor apartment building.
 """
 import asyncio
+import threading
 import time
-import random
 import enum
+import itertools
+import math
+from collections import deque
 from dataclasses import dataclass, field
-from typing import Dict, List, Set, Optional, Tuple, Any
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Tuple, Any
 import json
 
+import numpy as np
 
-class Direction(enum.Enum):
+try:
+    from numba import njit
+except ImportError:  # numba is optional; fall back to plain NumPy
+    njit = None
+
+# Maximum number of events and completed passengers kept in memory
+EVENT_LOG_SIZE = 10_000
+COMPLETED_PASSENGERS_SIZE = 10_000
+
+# Source of state versions, shared by all systems so that a version is never
+# reused when the simulation is replaced
+_state_versions = itertools.count(1)
+
+
+def iter_floors(mask: int) -> Iterator[int]:
+    """Iterate over the floors set in a floor bitmask, lowest first."""
+    while mask:
+        lowest = mask & -mask
+        yield lowest.bit_length() - 1
+        mask ^= lowest
+
+
+class Direction(enum.IntEnum):
     """Elevator movement direction."""
 
     UP = 1
@@ -21,31 +47,168 @@ class Direction(enum.Enum):
     IDLE = 0
 
 
-class ElevatorState(enum.Enum):
+class ElevatorState(enum.IntEnum):
     """Current state of an elevator."""
 
-    MOVING = "moving"
-    STOPPED = "stopped"
-    LOADING = "loading"  # When doors are open and passengers are entering/exiting
+    STOPPED = 0
+    MOVING = 1
+    LOADING = 2  # When doors are open and passengers are entering/exiting
+
+
+# Plain int values of the enums, used for comparisons on the hot path
+_UP, _DOWN, _IDLE = int(Direction.UP), int(Direction.DOWN), int(Direction.IDLE)
+_MOVING, _LOADING = int(ElevatorState.MOVING), int(ElevatorState.LOADING)
+
+# Number of moving elevators from which positions are updated with the
+# compiled kernel. Below it, copying the elevators' state into arrays and back
+# costs more than the kernel saves (measured crossover: 16-32 elevators).
+KERNEL_MIN_ELEVATORS = 32
+
+
+def _advance_elevators_loop(cur, dest, direction, speed, dt, arrived) -> int:
+    """Move elevators one time step toward their destinations.
+
+    Takes equal-length lists or arrays with one entry per moving elevator.
+    Positions are updated in place. Elevators that reach their destination
+    are snapped onto it and flagged in arrived; returns the number of arrivals.
+    """
+    n_arrived = 0
+    for i in range(len(cur)):
+        target = float(dest[i])
+        if direction[i] == _UP:
+            position = min(cur[i] + speed[i] * dt, target)
+        else:
+            position = max(cur[i] - speed[i] * dt, target)
+        if abs(position - target) < 0.01:
+            position = target
+            arrived[i] = True
+            n_arrived += 1
+        else:
+            arrived[i] = False
+        cur[i] = position
+    return n_arrived
+
+
+# Compiled version of the loop for large numbers of elevators, if numba is
+# installed
+_advance_elevators = (
+    njit(cache=True, fastmath=True)(_advance_elevators_loop) if njit else None
+)
+
+
+class RunningMean:
+    """Incrementally updated mean of a series of values (Welford's method)."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+
+    def add(self, value: float) -> None:
+        """Add a value to the series."""
+        self.count += 1
+        self.mean += (value - self.mean) / self.count
+
+
+# Fields of each event type, in the order they are passed to log_event()
+EVENT_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "new_passenger": ("passenger_id", "start_floor", "destination_floor"),
+    "button_press": ("floor", "direction"),
+    "elevator_assigned": ("elevator_id", "floor", "direction"),
+    "elevator_arrived": ("elevator_id", "floor"),
+    "passenger_arrived": (
+        "passenger_id",
+        "elevator_id",
+        "floor",
+        "wait_time",
+        "ride_time",
+        "total_time",
+    ),
+    "passengers_boarded": (
+        "elevator_id",
+        "floor",
+        "passenger_count",
+        "passenger_ids",
+    ),
+    "elevator_moving": ("elevator_id", "from_floor", "to_floor", "direction"),
+    "elevator_idle": ("elevator_id", "floor"),
+    "simulation_error": ("error",),
+}
+
+
+class EventLog:
+    """Bounded log of the most recent simulation events.
+
+    Events are kept as (time, type, values) tuples, which are much cheaper to
+    append than dicts; they are converted to dicts only when read.
+    """
+
+    def __init__(self, size: int = EVENT_LOG_SIZE):
+        self.size = size
+        self._events: Deque[Tuple[float, str, Tuple[Any, ...]]] = deque(
+            maxlen=size
+        )
+
+    def __len__(self) -> int:
+        return len(self._events)
 
+    def append(self, time: float, event_type: str, values: Tuple[Any, ...]) -> None:
+        """Record an event whose field values are given in EVENT_FIELDS order."""
+        self._events.append((time, event_type, values))
 
-@dataclass
+    @staticmethod
+    def _to_dict(event: Tuple[float, str, Tuple[Any, ...]]) -> Dict[str, Any]:
+        time, event_type, values = event
+        result = {"time": time, "type": event_type}
+        result.update(zip(EVENT_FIELDS[event_type], values))
+        return result
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        """Get an event by position, oldest first; negative indices count back."""
+        return self._to_dict(self._events[index])
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return map(self._to_dict, self._events)
+
+    def recent(self, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        """Get up to limit events, newest first, after skipping the newest skip."""
+        skip = max(skip, 0)
+        newest = itertools.islice(reversed(self._events), skip, skip + max(limit, 0))
+        return [self._to_dict(event) for event in newest]
+
+
+@dataclass(slots=True)
 class Passenger:
     """Represents a passenger in the simulation."""
 
     id: int
     start_floor: int
     destination_floor: int
-    wait_start_time: float = field(default_factory=time.time)
+    wait_start_time: float  # Simulation time the passenger started waiting
     elevator_id: Optional[int] = None
     boarding_time: Optional[float] = None
     arrival_time: Optional[float] = None
+    # Serialized form, reused until the passenger boards or arrives
+    _version: int = field(default=0, init=False, repr=False, compare=False)
+    _dict_cache: Optional[Dict[str, Any]] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _dict_version: int = field(default=-1, init=False, repr=False, compare=False)
 
-    @property
-    def wait_time(self) -> float:
-        """Time the passenger has been waiting for an elevator."""
+    def board(self, elevator_id: int, boarding_time: float) -> None:
+        """Record the passenger boarding an elevator."""
+        self.elevator_id = elevator_id
+        self.boarding_time = boarding_time
+        self._version += 1
+
+    def arrive(self, arrival_time: float) -> None:
+        """Record the passenger arriving at their destination."""
+        self.arrival_time = arrival_time
+        self._version += 1
+
+    def wait_time(self, now: float) -> float:
+        """Time the passenger waited for an elevator, as of simulation time now."""
         if self.boarding_time is None:
-            return time.time() - self.wait_start_time
+            return now - self.wait_start_time
         return self.boarding_time - self.wait_start_time
 
     @property
@@ -62,206 +225,476 @@ class Passenger:
             return None
         return self.arrival_time - self.wait_start_time
 
-    def to_dict(self) -> Dict[str, Any]:
-        """Convert to dictionary for JSON serialization."""
-        return {
+    def to_dict(self, now: float) -> Dict[str, Any]:
+        """Convert to dictionary for JSON serialization.
+
+        now is the current simulation time, used for the wait time of a
+        passenger who has not boarded yet. Once the passenger has boarded the
+        result only changes on arrival, so it is cached and shared between
+        callers.
+        """
+        boarding_time = self.boarding_time
+        if boarding_time is not None and self._dict_version == self._version:
+            return self._dict_cache
+
+        arrival_time = self.arrival_time
+        wait_start_time = self.wait_start_time
+        if boarding_time is None:
+            wait_time = now - wait_start_time
+            ride_time = None
+        else:
+            wait_time = boarding_time - wait_start_time
+            ride_time = None if arrival_time is None else arrival_time - boarding_time
+        total_time = None if arrival_time is None else arrival_time - wait_start_time
+
+        result = {
             "id": self.id,
             "start_floor": self.start_floor,
             "destination_floor": self.destination_floor,
-            "wait_start_time": self.wait_start_time,
+            "wait_start_time": wait_start_time,
             "elevator_id": self.elevator_id,
-            "boarding_time": self.boarding_time,
-            "arrival_time": self.arrival_time,
-            "wait_time": self.wait_time,
-            "ride_time": self.ride_time,
-            "total_time": self.total_time,
+            "boarding_time": boarding_time,
+            "arrival_time": arrival_time,
+            "wait_time": wait_time,
+            "ride_time": ride_time,
+            "total_time": total_time,
         }
+        if boarding_time is not None:
+            self._dict_cache = result
+            self._dict_version = self._version
+        return result
 
 
-@dataclass
+@dataclass(slots=True)
 class Elevator:
     """Represents an elevator in the simulation."""
 
     id: int
-    current_floor: float = (
-        1.0  # Float to represent position between floors during movement
-    )
+    current_floor: float = 1.0  # Fractional while moving between floors
     destination_floor: Optional[int] = None
     direction: Direction = Direction.IDLE
     state: ElevatorState = ElevatorState.STOPPED
     passengers: List[Passenger] = field(default_factory=list)
-    target_floors: Set[int] = field(default_factory=set)
+    # Floors the elevator will stop at, as a bitmask (bit n set = floor n)
+    target_mask: int = 0
     capacity: int = 10
     speed: float = 0.5  # Floors per second
     door_time: float = 2.0  # Seconds to open/close doors and load/unload
+    # Serialized form, reused until the elevator is next modified
+    _version: int = field(default=0, init=False, repr=False, compare=False)
+    _dict_cache: Optional[Dict[str, Any]] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _dict_version: int = field(default=-1, init=False, repr=False, compare=False)
+    # Last next_floor result, and the targets, direction and position it was
+    # found for
+    _next_floor: Optional[int] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _next_key: Optional[Tuple[int, int, float]] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    def touch(self) -> None:
+        """Mark the elevator as modified, invalidating the cached to_dict()."""
+        self._version += 1
 
     @property
     def is_full(self) -> bool:
         """Check if elevator is at capacity."""
         return len(self.passengers) >= self.capacity
 
+    @property
+    def target_floors(self) -> List[int]:
+        """Floors the elevator will stop at, lowest first."""
+        return list(iter_floors(self.target_mask))
+
+    @property
+    def n_targets(self) -> int:
+        """Number of floors the elevator will stop at."""
+        return self.target_mask.bit_count()
+
     @property
     def next_floor(self) -> Optional[int]:
-        """Get the next floor the elevator will stop at."""
-        if not self.target_floors:
+        """Get the next floor the elevator will stop at.
+
+        The result is cached until the targets, direction or position change.
+        """
+        key = (self.target_mask, self.direction, self.current_floor)
+        if key != self._next_key:
+            self._next_floor = self._find_next_floor()
+            self._next_key = key
+        return self._next_floor
+
+    def _find_next_floor(self) -> Optional[int]:
+        mask = self.target_mask
+        if not mask:
             return None
 
+        current = self.current_floor
+        floor = int(current)
+        direction = self.direction
+        # Targets strictly above the current floor
+        above = mask >> (floor + 1) << (floor + 1)
+
         # If moving up, get the next floor above current
-        if self.direction == Direction.UP:
-            above_floors = [
-                f for f in self.target_floors if f > int(self.current_floor)
-            ]
-            return min(above_floors) if above_floors else max(self.target_floors)
+        if direction == _UP:
+            if above:
+                return (above & -above).bit_length() - 1
+            return mask.bit_length() - 1
 
         # If moving down, get the next floor below current
-        elif self.direction == Direction.DOWN:
-            below_floors = [
-                f for f in self.target_floors if f < int(self.current_floor)
-            ]
-            return max(below_floors) if below_floors else min(self.target_floors)
+        elif direction == _DOWN:
+            below = mask & ((1 << floor) - 1)
+            if below:
+                return below.bit_length() - 1
+            return (mask & -mask).bit_length() - 1
 
-        # If idle, get the closest floor
+        # If idle, get the closest floor, preferring the lower one on a tie
         else:
-            return min(self.target_floors, key=lambda f: abs(f - self.current_floor))
+            at_or_below = (mask ^ above).bit_length() - 1
+            if not above:
+                return at_or_below
+            lowest_above = (above & -above).bit_length() - 1
+            if at_or_below < 0 or lowest_above - current < current - at_or_below:
+                return lowest_above
+            return at_or_below
 
     def add_target_floor(self, floor: int) -> None:
         """Add a floor to the elevator's targets."""
-        self.target_floors.add(floor)
+        self.target_mask |= 1 << floor
+        self.touch()
 
         # Update direction if elevator is idle
-        if self.direction == Direction.IDLE and floor != self.current_floor:
-            self.direction = (
-                Direction.UP if floor > self.current_floor else Direction.DOWN
-            )
+        current = self.current_floor
+        if self.direction == _IDLE and floor != current:
+            self.direction = Direction.UP if floor > current else Direction.DOWN
+
+    def remove_target_floor(self, floor: int) -> None:
+        """Remove a floor from the elevator's targets."""
+        self.target_mask &= ~(1 << floor)
+        self.touch()
 
     def update_direction(self) -> None:
         """Update the elevator's direction based on target floors."""
-        if not self.target_floors:
+        self.touch()
+        if not self.target_mask:
             self.direction = Direction.IDLE
             return
 
         next_target = self.next_floor
+        current = self.current_floor
         if next_target is None:
             self.direction = Direction.IDLE
-        elif next_target > int(self.current_floor):
+        elif next_target > int(current):
             self.direction = Direction.UP
-        elif next_target < int(self.current_floor):
+        elif next_target < int(current):
             self.direction = Direction.DOWN
         else:
             # We're at a target floor, keep the same direction
             # unless there are no more floors in this direction
-            if self.direction == Direction.UP and all(
-                f <= self.current_floor for f in self.target_floors
-            ):
+            direction = self.direction
+            if direction == _UP and not self.target_mask >> (int(current) + 1):
                 self.direction = Direction.DOWN
-            elif self.direction == Direction.DOWN and all(
-                f >= self.current_floor for f in self.target_floors
+            elif direction == _DOWN and not self.target_mask & (
+                (1 << math.ceil(current)) - 1
             ):
                 self.direction = Direction.UP
 
     def to_dict(self) -> Dict[str, Any]:
-        """Convert to dictionary for JSON serialization."""
-        return {
-            "id": self.id,
-            "current_floor": self.current_floor,
-            "destination_floor": self.destination_floor,
-            "direction": self.direction.name,
-            "state": self.state.name,
-            "passengers": len(self.passengers),
-            "target_floors": list(self.target_floors),
-            "is_full": self.is_full,
-        }
+        """Convert to dictionary for JSON serialization.
+
+        The result is cached and shared between callers until touch() is called.
+        """
+        if self._dict_version != self._version:
+            self._dict_cache = {
+                "id": self.id,
+                "current_floor": self.current_floor,
+                "destination_floor": self.destination_floor,
+                "direction": self.direction.name,
+                "state": self.state.name,
+                "passengers": len(self.passengers),
+                "target_floors": self.target_floors,
+                "is_full": self.is_full,
+            }
+            self._dict_version = self._version
+        return self._dict_cache
 
 
 class ElevatorSystem:
     """Manages the system of elevators and passenger requests."""
 
     def __init__(
-        self, num_elevators: int = 6, num_floors: int = 25, time_scale: float = 1.0
+        self,
+        num_elevators: int = 6,
+        num_floors: int = 25,
+        time_scale: float = 1.0,
+        log_enabled: bool = True,
     ):
         self.num_elevators = num_elevators
         self.num_floors = num_floors
         self.time_scale = time_scale
-        self.elevators = [Elevator(id=i) for i in range(num_elevators)]
-        self.waiting_passengers: Dict[int, List[Passenger]] = {
-            floor: [] for floor in range(1, num_floors + 1)
+        self._init_elevators()
+        # Passengers waiting on each floor, in order of arrival
+        self.waiting_passengers: Dict[int, Deque[Passenger]] = {
+            floor: deque() for floor in range(1, num_floors + 1)
         }
-        self.completed_passengers: List[Passenger] = []
+        self.waiting_count = 0
+        # Number of waiting passengers going up and down from each floor
+        self.up_waiting_count = [0] * (num_floors + 1)
+        self.down_waiting_count = [0] * (num_floors + 1)
+        self.completed_passengers: Deque[Passenger] = deque(
+            maxlen=COMPLETED_PASSENGERS_SIZE
+        )
+        self.completed_count = 0
         self.passenger_id_counter = 0
-        self.event_log: List[Dict[str, Any]] = []
-        self.up_requests: Set[int] = set()
-        self.down_requests: Set[int] = set()
+        self.event_log = EventLog()
+        # Whether events are recorded in event_log; headless runs can turn
+        # this off to skip the cost of logging
+        self.log_enabled = log_enabled
+        # Called with (time, event_type, values) for every event, whether or
+        # not it is logged. Events are queued while the simulation steps and
+        # delivered afterwards on the event loop; see deliver_events()
+        self.subscribers: List[Callable[[float, str, Tuple[Any, ...]], None]] = []
+        self._pending_events: List[Tuple[float, str, Tuple[Any, ...]]] = []
+        # Running averages over all completed trips, so statistics do not need
+        # to scan completed_passengers
+        self.wait_time_stats = RunningMean()
+        self.ride_time_stats = RunningMean()
+        self.total_time_stats = RunningMean()
+        # Floors with pending hall calls, as bitmasks (bit n set = floor n)
+        self.up_requests = 0
+        self.down_requests = 0
         self.running = False
         self.simulation_time = 0.0
         self.real_start_time = None
+        # Guards the simulation state, which is stepped on a worker thread
+        # while request handlers read and modify it on the event loop
+        self.lock = threading.RLock()
+        # Incremented whenever the simulation state changes; used to reuse
+        # the last get_system_state() snapshot while nothing has changed
+        self.state_version = next(_state_versions)
+        self._state_cache: Optional[Dict[str, Any]] = None
+        self._state_cache_version = -1
+        # Set whenever the state changes, so consumers can wait for updates
+        self.state_changed = asyncio.Event()
+        # Event loop the simulation last ran on, for notifying state_changed
+        # waiters from other threads
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
 
     def reset(self) -> None:
         """Reset the simulation to initial state."""
+        with self.lock:
+            self._init_elevators()
+            self.waiting_passengers = {
+                floor: deque() for floor in range(1, self.num_floors + 1)
+            }
+            self.waiting_count = 0
+            self.up_waiting_count = [0] * (self.num_floors + 1)
+            self.down_waiting_count = [0] * (self.num_floors + 1)
+            self.completed_passengers = deque(maxlen=COMPLETED_PASSENGERS_SIZE)
+            self.completed_count = 0
+            self.passenger_id_counter = 0
+            self.event_log = EventLog()
+            self._pending_events = []
+            self.wait_time_stats = RunningMean()
+            self.ride_time_stats = RunningMean()
+            self.total_time_stats = RunningMean()
+            self.up_requests = 0
+            self.down_requests = 0
+            self.simulation_time = 0.0
+            self.real_start_time = None
+            self.mark_state_changed()
+
+    def _init_elevators(self) -> None:
+        """Create the elevators, all stopped on the ground floor."""
         self.elevators = [Elevator(id=i) for i in range(self.num_elevators)]
-        self.waiting_passengers = {floor: [] for floor in range(1, self.num_floors + 1)}
-        self.completed_passengers = []
-        self.passenger_id_counter = 0
-        self.event_log = []
-        self.up_requests = set()
-        self.down_requests = set()
-        self.simulation_time = 0.0
-        self.real_start_time = None
 
-    def log_event(self, event_type: str, details: Dict[str, Any]) -> None:
-        """Log an event in the simulation."""
-        event = {"time": self.simulation_time, "type": event_type, **details}
-        self.event_log.append(event)
-        return event
+    def mark_state_changed(self) -> None:
+        """Invalidate the cached system state snapshot and notify waiters.
+
+        May be called from a worker thread, in which case the waiters are
+        notified on the simulation's event loop.
+        """
+        self.state_version = next(_state_versions)
+        loop = self._loop
+        try:
+            on_loop = asyncio.get_running_loop() is loop
+        except RuntimeError:
+            on_loop = False
+        if loop is None or on_loop or loop.is_closed():
+            self.state_changed.set()
+        else:
+            loop.call_soon_threadsafe(self.state_changed.set)
+
+    def log_event(self, event_type: str, *values: Any) -> None:
+        """Log an event in the simulation.
+
+        values are the event's fields, in the order listed in EVENT_FIELDS.
+        If logging is enabled the event is recorded in event_log, and if there
+        are subscribers it is queued for them. Must be called with the lock
+        held.
+        """
+        if self.log_enabled:
+            self.event_log.append(self.simulation_time, event_type, values)
+        if self.subscribers:
+            self._pending_events.append((self.simulation_time, event_type, values))
+
+    def deliver_events(self) -> None:
+        """Pass the events queued since the last call to the subscribers.
+
+        Called by run_simulation() on the event loop after each step, outside
+        the lock. A subscriber that raises is reported and skipped, so it
+        cannot interrupt the simulation or the other subscribers.
+        """
+        with self.lock:
+            events = self._pending_events
+            self._pending_events = []
+
+        for event in events:
+            for subscriber in self.subscribers:
+                try:
+                    subscriber(*event)
+                except Exception as e:
+                    print(f"Error in event subscriber: {e}")
 
     def add_passenger(self, start_floor: int, destination_floor: int) -> Passenger:
         """Add a new passenger to the simulation."""
         if start_floor == destination_floor:
             raise ValueError("Start and destination floors cannot be the same")
 
+        with self.lock:
+            passenger = self._add_passenger(start_floor, destination_floor)
+            self.mark_state_changed()
+
+        return passenger
+
+    def add_passengers(
+        self, start_floors: List[int], destination_floors: List[int]
+    ) -> List[Passenger]:
+        """Add a batch of new passengers to the simulation."""
+        if any(s == d for s, d in zip(start_floors, destination_floors)):
+            raise ValueError("Start and destination floors cannot be the same")
+
+        with self.lock:
+            passengers = [
+                self._add_passenger(start_floor, destination_floor)
+                for start_floor, destination_floor in zip(
+                    start_floors, destination_floors
+                )
+            ]
+            if passengers:
+                self.mark_state_changed()
+
+        return passengers
+
+    def _add_passenger(self, start_floor: int, destination_floor: int) -> Passenger:
+        """Add a passenger; the caller holds the lock and marks the state changed."""
         passenger = Passenger(
             id=self.passenger_id_counter,
             start_floor=start_floor,
             destination_floor=destination_floor,
+            wait_start_time=self.simulation_time,
         )
         self.passenger_id_counter += 1
         self.waiting_passengers[start_floor].append(passenger)
+        self.waiting_count += 1
 
         # Register floor request
         if destination_floor > start_floor:
-            self.up_requests.add(start_floor)
+            self.up_waiting_count[start_floor] += 1
+            self.up_requests |= 1 << start_floor
         else:
-            self.down_requests.add(start_floor)
-
-        event = self.log_event(
-            "new_passenger",
-            {
-                "passenger_id": passenger.id,
-                "start_floor": start_floor,
-                "destination_floor": destination_floor,
-            },
-        )
+            self.down_waiting_count[start_floor] += 1
+            self.down_requests |= 1 << start_floor
 
+        self.log_event("new_passenger", passenger.id, start_floor, destination_floor)
         return passenger
 
+    def press_button(self, floor: int, direction: Direction) -> Dict[str, Any]:
+        """Register a call button press on a floor and assign an elevator."""
+        with self.lock:
+            if direction == Direction.UP:
+                self.up_requests |= 1 << floor
+            else:
+                self.down_requests |= 1 << floor
+
+            self.assign_elevator(floor, direction)
+            direction_name = direction.name.lower()
+            self.log_event("button_press", floor, direction_name)
+            self.mark_state_changed()
+
+            # Built here rather than read back, as the log may be disabled
+            return {
+                "time": self.simulation_time,
+                "type": "button_press",
+                "floor": floor,
+                "direction": direction_name,
+            }
+
     def get_system_state(self) -> Dict[str, Any]:
         """Get the current state of the entire system."""
+        with self.lock:
+            return {
+                "time": self.simulation_time,
+                "elevators": self.elevator_dicts(),
+                # Keyed by floor as a string, as JSON and MessagePack clients
+                # expect string map keys
+                "waiting_passengers": {
+                    str(floor): len(passengers)
+                    for floor, passengers in self.waiting_passengers.items()
+                    if passengers
+                },
+                "completed_trips": self.completed_count,
+                "up_requests": list(iter_floors(self.up_requests)),
+                "down_requests": list(iter_floors(self.down_requests)),
+            }
+
+    def elevator_dicts(self) -> List[Dict[str, Any]]:
+        """Convert all elevators to dictionaries for JSON serialization.
+
+        Each elevator's dict is cached and shared between callers until the
+        elevator is modified.
+        """
+        return [elevator.to_dict() for elevator in self.elevators]
+
+    def get_system_state_cached(self) -> Dict[str, Any]:
+        """Get the system state, rebuilding it only if the state has changed.
+
+        The returned dict is shared between callers and must not be mutated.
+        """
+        with self.lock:
+            if self._state_cache_version != self.state_version:
+                self._state_cache = self.get_system_state()
+                self._state_cache_version = self.state_version
+            return self._state_cache
+
+    def complete_passenger(self, passenger: Passenger) -> None:
+        """Record a passenger who has arrived at their destination."""
+        passenger.arrive(self.simulation_time)
+        self.completed_passengers.append(passenger)
+        self.completed_count += 1
+
+        self.wait_time_stats.add(passenger.wait_time(self.simulation_time))
+        ride_time = passenger.ride_time
+        if ride_time is not None:
+            self.ride_time_stats.add(ride_time)
+        total_time = passenger.total_time
+        if total_time is not None:
+            self.total_time_stats.add(total_time)
+
+    def trip_statistics(self) -> Dict[str, float]:
+        """Get average wait, ride and total times over all completed trips."""
         return {
-            "time": self.simulation_time,
-            "elevators": [elevator.to_dict() for elevator in self.elevators],
-            "waiting_passengers": {
-                floor: len(passengers)
-                for floor, passengers in self.waiting_passengers.items()
-                if passengers
-            },
-            "completed_trips": len(self.completed_passengers),
-            "up_requests": list(self.up_requests),
-            "down_requests": list(self.down_requests),
+            "average_wait_time": self.wait_time_stats.mean,
+            "average_ride_time": self.ride_time_stats.mean,
+            "average_total_time": self.total_time_stats.mean,
         }
 
     def assign_elevator(self, floor: int, direction: Direction) -> None:
         """Assign the most suitable elevator to a floor request."""
         best_elevator = None
-        best_score = float("inf")
+        best_score = math.inf
 
         for elevator in self.elevators:
             # Skip full elevators
@@ -269,22 +702,24 @@ class ElevatorSystem:
                 continue
 
             # Calculate a score based on distance and direction
-            score = abs(elevator.current_floor - floor)
-
-            # Elevators moving in the same direction get priority
-            if elevator.direction == direction:
-                # If elevator is moving toward the floor, prioritize it
-                if (direction == Direction.UP and elevator.current_floor < floor) or (
-                    direction == Direction.DOWN and elevator.current_floor > floor
+            current_floor = elevator.current_floor
+            elevator_direction = elevator.direction
+            score = abs(current_floor - floor)
+
+            # Elevators moving toward the floor in the requested direction get
+            # a significant bonus
+            if elevator_direction == direction:
+                if (direction == _UP and current_floor < floor) or (
+                    direction == _DOWN and current_floor > floor
                 ):
-                    score -= 10  # Significant bonus for elevators already going in the right direction
+                    score -= 10
 
             # Idle elevators get a slight bonus
-            if elevator.direction == Direction.IDLE:
+            if elevator_direction == _IDLE:
                 score -= 5
 
             # Elevators with fewer stops get priority
-            score += len(elevator.target_floors) * 2
+            score += elevator.target_mask.bit_count() * 2
 
             if score < best_score:
                 best_score = score
@@ -293,240 +728,226 @@ class ElevatorSystem:
         if best_elevator:
             best_elevator.add_target_floor(floor)
             self.log_event(
-                "elevator_assigned",
-                {
-                    "elevator_id": best_elevator.id,
-                    "floor": floor,
-                    "direction": direction.name,
-                },
+                "elevator_assigned", best_elevator.id, floor, direction.name
             )
 
-    async def update_elevators(self) -> List[Dict[str, Any]]:
-        """Update the state of all elevators for one time step."""
-        events = []
+    def update_elevators(self) -> None:
+        """Update the state of all elevators for one time step.
+
+        Elevators are processed in stages according to their state at the start
+        of the step, so an elevator changes state at most once per step.
+        """
         time_step = 0.1 * self.time_scale  # Base time step adjusted by time scale
 
+        moving = []
+        loading = []
+        starting = []  # Stopped elevators that have targets but no destination
         for elevator in self.elevators:
-            # Skip elevators that are idle and have no targets
-            if elevator.state == ElevatorState.IDLE and not elevator.target_floors:
-                continue
-
-            if elevator.state == ElevatorState.MOVING:
-                # Calculate new position
-                move_distance = elevator.speed * time_step
-                if elevator.direction == Direction.UP:
-                    elevator.current_floor = min(
-                        elevator.current_floor + move_distance,
-                        float(elevator.destination_floor),
-                    )
-                else:
-                    elevator.current_floor = max(
-                        elevator.current_floor - move_distance,
-                        float(elevator.destination_floor),
-                    )
-
-                # Check if we've arrived at a destination
-                if abs(elevator.current_floor - elevator.destination_floor) < 0.01:
-                    elevator.current_floor = float(elevator.destination_floor)
-                    elevator.state = ElevatorState.LOADING
-                    elevator.target_floors.discard(elevator.destination_floor)
-
-                    # Log arrival event
-                    events.append(
-                        self.log_event(
-                            "elevator_arrived",
-                            {
-                                "elevator_id": elevator.id,
-                                "floor": elevator.destination_floor,
-                            },
-                        )
-                    )
-
-                    # Handle passengers getting off
-                    departing_passengers = [
-                        p
-                        for p in elevator.passengers
-                        if p.destination_floor == elevator.destination_floor
-                    ]
-                    for passenger in departing_passengers:
-                        elevator.passengers.remove(passenger)
-                        passenger.arrival_time = self.simulation_time
-                        self.completed_passengers.append(passenger)
-
-                        events.append(
-                            self.log_event(
-                                "passenger_arrived",
-                                {
-                                    "passenger_id": passenger.id,
-                                    "elevator_id": elevator.id,
-                                    "floor": elevator.destination_floor,
-                                    "wait_time": passenger.wait_time,
-                                    "ride_time": passenger.ride_time,
-                                    "total_time": passenger.total_time,
-                                },
-                            )
-                        )
-
-                    # Handle passengers getting on
-                    direction = elevator.direction
-                    boarding_passengers = []
-
-                    floor_passengers = self.waiting_passengers[
-                        elevator.destination_floor
-                    ]
-
-                    # Filter passengers going in the elevator's direction
-                    if direction == Direction.UP:
-                        potential_passengers = [
-                            p
-                            for p in floor_passengers
-                            if p.destination_floor > elevator.destination_floor
-                        ]
-                        self.up_requests.discard(elevator.destination_floor)
-                    elif direction == Direction.DOWN:
-                        potential_passengers = [
-                            p
-                            for p in floor_passengers
-                            if p.destination_floor < elevator.destination_floor
-                        ]
-                        self.down_requests.discard(elevator.destination_floor)
-                    else:
-                        # If elevator is now idle, take all waiting passengers
-                        potential_passengers = floor_passengers.copy()
-                        self.up_requests.discard(elevator.destination_floor)
-                        self.down_requests.discard(elevator.destination_floor)
-
-                    # Board as many passengers as capacity allows
-                    remaining_capacity = elevator.capacity - len(elevator.passengers)
-                    for passenger in potential_passengers[:remaining_capacity]:
-                        floor_passengers.remove(passenger)
-                        passenger.elevator_id = elevator.id
-                        passenger.boarding_time = self.simulation_time
-                        elevator.passengers.append(passenger)
-                        elevator.add_target_floor(passenger.destination_floor)
-                        boarding_passengers.append(passenger)
-
-                    # Log boarding event if passengers boarded
-                    if boarding_passengers:
-                        events.append(
-                            self.log_event(
-                                "passengers_boarded",
-                                {
-                                    "elevator_id": elevator.id,
-                                    "floor": elevator.destination_floor,
-                                    "passenger_count": len(boarding_passengers),
-                                    "passenger_ids": [
-                                        p.id for p in boarding_passengers
-                                    ],
-                                },
-                            )
-                        )
-
-                    # If floor still has waiting passengers in the same direction, re-add the request
-                    if direction == Direction.UP:
-                        if any(
-                            p.destination_floor > elevator.destination_floor
-                            for p in floor_passengers
-                        ):
-                            self.up_requests.add(elevator.destination_floor)
-                    elif direction == Direction.DOWN:
-                        if any(
-                            p.destination_floor < elevator.destination_floor
-                            for p in floor_passengers
-                        ):
-                            self.down_requests.add(elevator.destination_floor)
-
-                    # Update elevator direction based on remaining targets
-                    elevator.update_direction()
-
-            elif elevator.state == ElevatorState.LOADING:
-                # After loading time completes, elevator becomes idle or starts moving to next target
-                elevator.state = ElevatorState.STOPPED
-
-                # Set next destination if there are target floors
-                if elevator.target_floors:
-                    next_floor = elevator.next_floor
-                    if next_floor is not None:
-                        elevator.destination_floor = next_floor
-                        elevator.direction = (
-                            Direction.UP
-                            if next_floor > elevator.current_floor
-                            else Direction.DOWN
-                        )
-                        elevator.state = ElevatorState.MOVING
-
-                        events.append(
-                            self.log_event(
-                                "elevator_moving",
-                                {
-                                    "elevator_id": elevator.id,
-                                    "from_floor": int(elevator.current_floor),
-                                    "to_floor": elevator.destination_floor,
-                                    "direction": elevator.direction.name,
-                                },
-                            )
-                        )
-                else:
-                    elevator.direction = Direction.IDLE
-                    elevator.destination_floor = None
-
-                    events.append(
-                        self.log_event(
-                            "elevator_idle",
-                            {
-                                "elevator_id": elevator.id,
-                                "floor": int(elevator.current_floor),
-                            },
-                        )
-                    )
+            state = elevator.state
+            if state == _MOVING:
+                moving.append(elevator)
+            elif state == _LOADING:
+                loading.append(elevator)
+            elif elevator.target_mask and elevator.destination_floor is None:
+                starting.append(elevator)
+
+        # Move all moving elevators toward their destinations at once
+        if moving:
+            for elevator in self._move_elevators(moving, time_step):
+                self._handle_arrival(elevator)
+
+        # After loading time completes, elevators become idle or start moving
+        # to their next target
+        for elevator in loading:
+            elevator.state = ElevatorState.STOPPED
+            elevator.touch()
+            if elevator.target_mask:
+                self._start_moving(elevator)
+            else:
+                elevator.direction = Direction.IDLE
+                elevator.destination_floor = None
+                self.log_event(
+                    "elevator_idle", elevator.id, int(elevator.current_floor)
+                )
 
-            elif elevator.state == ElevatorState.STOPPED:
-                # Check if there are any new targets
-                if elevator.target_floors and elevator.destination_floor is None:
-                    next_floor = elevator.next_floor
-                    if next_floor is not None:
-                        elevator.destination_floor = next_floor
-                        elevator.direction = (
-                            Direction.UP
-                            if next_floor > elevator.current_floor
-                            else Direction.DOWN
-                        )
-                        elevator.state = ElevatorState.MOVING
-
-                        events.append(
-                            self.log_event(
-                                "elevator_moving",
-                                {
-                                    "elevator_id": elevator.id,
-                                    "from_floor": int(elevator.current_floor),
-                                    "to_floor": elevator.destination_floor,
-                                    "direction": elevator.direction.name,
-                                },
-                            )
-                        )
+        # Stopped elevators with new targets start moving
+        for elevator in starting:
+            self._start_moving(elevator)
 
         # Process pending requests that haven't been assigned
-        for floor in self.up_requests.copy():
-            if self.waiting_passengers[floor] and any(
-                p.destination_floor > floor for p in self.waiting_passengers[floor]
-            ):
+        for floor in iter_floors(self.up_requests):
+            if self.up_waiting_count[floor]:
                 self.assign_elevator(floor, Direction.UP)
 
-        for floor in self.down_requests.copy():
-            if self.waiting_passengers[floor] and any(
-                p.destination_floor < floor for p in self.waiting_passengers[floor]
-            ):
+        for floor in iter_floors(self.down_requests):
+            if self.down_waiting_count[floor]:
                 self.assign_elevator(floor, Direction.DOWN)
 
-        return events
+    def _move_elevators(
+        self, moving: List[Elevator], time_step: float
+    ) -> List[Elevator]:
+        """Move elevators one time step toward their destinations.
+
+        Returns the elevators that arrived. The elevators' state is copied
+        into arrays for the compiled kernel only when there are enough of them
+        for it to pay off.
+        """
+        n = len(moving)
+        current_floors = [elevator.current_floor for elevator in moving]
+        destinations = [elevator.destination_floor for elevator in moving]
+        directions = [elevator.direction for elevator in moving]
+        speeds = [elevator.speed for elevator in moving]
+
+        if _advance_elevators is not None and n >= KERNEL_MIN_ELEVATORS:
+            positions = np.array(current_floors)
+            flags = np.zeros(n, np.bool_)
+            _advance_elevators(
+                positions,
+                np.array(destinations, np.int64),
+                np.array(directions, np.int8),
+                np.array(speeds),
+                time_step,
+                flags,
+            )
+            current_floors = positions.tolist()
+            arrived = flags.tolist()
+        else:
+            arrived = [False] * n
+            _advance_elevators_loop(
+                current_floors, destinations, directions, speeds, time_step, arrived
+            )
 
-    async def run_simulation(self, max_time: float = None) -> None:
-        """Run the simulation until max_time is reached."""
-        self.running = True
-        self.real_start_time = time.time()
+        for elevator, position in zip(moving, current_floors):
+            elevator.current_floor = position
+            elevator.touch()
+        return [elevator for elevator, done in zip(moving, arrived) if done]
+
+    def _handle_arrival(self, elevator: Elevator) -> None:
+        """Let passengers off and on an elevator that has reached its destination."""
+        elevator.state = ElevatorState.LOADING
+        elevator.remove_target_floor(elevator.destination_floor)
+
+        # Log arrival event
+        self.log_event("elevator_arrived", elevator.id, elevator.destination_floor)
+
+        floor = elevator.destination_floor
+        passengers = elevator.passengers
+        # Skip building event fields when nothing would receive them
+        log = self.log_enabled or bool(self.subscribers)
+
+        # Handle passengers getting off
+        departing_passengers = [p for p in passengers if p.destination_floor == floor]
+        if departing_passengers:
+            passengers[:] = [p for p in passengers if p.destination_floor != floor]
+        for passenger in departing_passengers:
+            self.complete_passenger(passenger)
+
+            if log:
+                self.log_event(
+                    "passenger_arrived",
+                    passenger.id,
+                    elevator.id,
+                    floor,
+                    passenger.wait_time(self.simulation_time),
+                    passenger.ride_time,
+                    passenger.total_time,
+                )
+
+        # Handle passengers getting on
+        direction = elevator.direction
+        floor_passengers = self.waiting_passengers[floor]
+
+        # Clear the hall call this elevator answers
+        if direction == _UP:
+            self.up_requests &= ~(1 << floor)
+        elif direction == _DOWN:
+            self.down_requests &= ~(1 << floor)
+        else:
+            self.up_requests &= ~(1 << floor)
+            self.down_requests &= ~(1 << floor)
+
+        # In one pass over the floor, split the waiting passengers into those
+        # boarding and those left behind. Passengers going in the elevator's
+        # direction board, longest waiting first, as capacity allows; an idle
+        # elevator takes passengers going either way
+        room = elevator.capacity - len(passengers)
+        boarding_passengers = []
+        remaining = []
+        boarded_up = 0
+        take_all = direction == _IDLE
+        up = direction == _UP
+        for passenger in floor_passengers:
+            going_up = passenger.destination_floor > floor
+            if room and (take_all or going_up == up):
+                boarding_passengers.append(passenger)
+                boarded_up += going_up
+                room -= 1
+            else:
+                remaining.append(passenger)
+
+        if boarding_passengers:
+            floor_passengers.clear()
+            floor_passengers.extend(remaining)
+            self.waiting_count -= len(boarding_passengers)
+            self.up_waiting_count[floor] -= boarded_up
+            self.down_waiting_count[floor] -= len(boarding_passengers) - boarded_up
+
+        for passenger in boarding_passengers:
+            passenger.board(elevator.id, self.simulation_time)
+            passengers.append(passenger)
+            elevator.add_target_floor(passenger.destination_floor)
+
+        # Log boarding event if passengers boarded
+        if boarding_passengers and log:
+            self.log_event(
+                "passengers_boarded",
+                elevator.id,
+                floor,
+                len(boarding_passengers),
+                [p.id for p in boarding_passengers],
+            )
 
-        try:
-            while self.running:
+        # If floor still has waiting passengers in the same direction, re-add the request
+        if direction == _UP:
+            if self.up_waiting_count[floor]:
+                self.up_requests |= 1 << floor
+        elif direction == _DOWN:
+            if self.down_waiting_count[floor]:
+                self.down_requests |= 1 << floor
+
+        # Update elevator direction based on remaining targets
+        elevator.update_direction()
+
+    def _start_moving(self, elevator: Elevator) -> None:
+        """Send a stopped elevator on to its next target floor."""
+        next_floor = elevator.next_floor
+        if next_floor is None:
+            return
+
+        elevator.destination_floor = next_floor
+        elevator.direction = (
+            Direction.UP if next_floor > elevator.current_floor else Direction.DOWN
+        )
+        elevator.state = ElevatorState.MOVING
+        elevator.touch()
+
+        self.log_event(
+            "elevator_moving",
+            elevator.id,
+            int(elevator.current_floor),
+            next_floor,
+            elevator.direction.name,
+        )
+
+    def step(self, steps: int = 1, max_time: Optional[float] = None) -> None:
+        """Advance the simulation by one or more time steps.
+
+        Stops early once max_time is reached. Safe to call from a worker
+        thread. Waiters on state_changed are not notified and queued events are
+        not delivered to subscribers; the caller does that from the event loop.
+        """
+        with self.lock:
+            for _ in range(steps):
                 if max_time and self.simulation_time >= max_time:
                     break
 
@@ -534,13 +955,58 @@ class ElevatorSystem:
                 self.simulation_time += 0.1 * self.time_scale
 
                 # Update elevators
-                await self.update_elevators()
+                self.update_elevators()
+            self.state_version = next(_state_versions)
+
+    async def run_simulation(
+        self, max_time: float = None, realtime: bool = True, batch_size: int = 100
+    ) -> None:
+        """Run the simulation until max_time is reached.
+
+        In realtime mode one step is taken every 0.1 s of wall time, paced
+        against monotonic deadlines so that the time spent stepping does not
+        slow the simulation down. Otherwise the simulation runs as fast as
+        possible, batch_size steps at a time, yielding to the event loop
+        between batches.
+        """
+        self.running = True
+        self.real_start_time = time.time()
+        loop = self._loop = asyncio.get_running_loop()
+        steps = 1 if realtime else batch_size
+        deadline = time.monotonic()
+
+        try:
+            while self.running:
+                if max_time and self.simulation_time >= max_time:
+                    break
 
-                # Sleep to control simulation speed
-                await asyncio.sleep(0.1)
+                # Step on a worker thread to keep the event loop responsive.
+                # Cancelling cannot stop a step that is already running there,
+                # so on cancellation wait for it to finish before returning.
+                future = loop.run_in_executor(None, self.step, steps, max_time)
+                try:
+                    await asyncio.shield(future)
+                except asyncio.CancelledError:
+                    await asyncio.wait([future])
+                    raise
+                self.state_changed.set()
+                self.deliver_events()
+
+                if not realtime:
+                    await asyncio.sleep(0)
+                    continue
+
+                # Sleep until the next step is due; if we have fallen behind,
+                # carry on from now rather than catching up in a burst
+                deadline += 0.1
+                delay = deadline - time.monotonic()
+                if delay < 0:
+                    deadline = time.monotonic()
+                await asyncio.sleep(max(delay, 0))
 
         except Exception as e:
-            self.log_event("simulation_error", {"error": str(e)})
+            with self.lock:
+                self.log_event("simulation_error", str(e))
             raise
         finally:
             self.running = False
@@ -560,12 +1026,17 @@ class PassengerGenerator:
         lobby_floor: int = 1,
         amenity_floor: int = 2,
         rooftop_floor: int = 25,
+        seed: Optional[int] = None,
     ):
         self.elevator_system = elevator_system
         self.time_scale = time_scale
         self.lobby_floor = lobby_floor
         self.amenity_floor = amenity_floor
         self.rooftop_floor = rooftop_floor
+        # Cumulative destination probabilities, indexed by start floor
+        self.destination_cdf = self.build_destination_table()
+        # Random source for all sampling
+        self._rng = np.random.default_rng(seed)
         self.running = False
 
     def get_time_of_day_factor(self, hour: int) -> float:
@@ -586,58 +1057,81 @@ class PassengerGenerator:
         else:
             return 0.3
 
+    def build_destination_table(self) -> np.ndarray:
+        """Build the cumulative destination distribution for every start floor.
+
+        Row s of the result is the CDF over destination floors (indexed by
+        floor) for a passenger starting on floor s. The probabilities follow
+        the building's usage patterns; the start floor itself is excluded.
+        """
+        num_floors = self.elevator_system.num_floors
+        floors = num_floors + 1
+        weights = np.zeros((floors, floors))
+        # Residential floors (3-24), chosen uniformly
+        residential = np.zeros(floors)
+        residential[3:num_floors] = 1.0
+        if residential.any():
+            residential /= residential.sum()
+
+        def add(row: np.ndarray, floor: int, p: float) -> None:
+            # Floors outside the building (e.g. a rooftop above num_floors)
+            # are never chosen
+            if 1 <= floor <= num_floors:
+                row[floor] += p
+
+        for start_floor in range(1, floors):
+            row = weights[start_floor]
+            if start_floor == self.lobby_floor:
+                # From lobby, people usually go to their apartments
+                # Small chance of going to amenity floor or rooftop
+                add(row, self.amenity_floor, 0.15)
+                add(row, self.rooftop_floor, 0.85 * 0.05)
+                row += 0.85 * 0.95 * residential
+            elif start_floor == self.amenity_floor:
+                # From amenity floor, people usually go to lobby or their apartments
+                add(row, self.lobby_floor, 0.4)
+                row += 0.6 * residential
+            elif start_floor == self.rooftop_floor:
+                # From rooftop, higher chance of going to lobby
+                add(row, self.lobby_floor, 0.6)
+                add(row, self.amenity_floor, 0.4 * 0.2)
+                row += 0.4 * 0.8 * residential
+            else:
+                # From residential floors, usually go to lobby or amenities,
+                # occasionally to another residential floor
+                add(row, self.lobby_floor, 0.7)
+                add(row, self.amenity_floor, 0.3 * 0.2)
+                add(row, self.rooftop_floor, 0.3 * 0.8 * 0.05)
+                others = residential.copy()
+                others[start_floor] = 0.0
+                if others.any():
+                    row += 0.3 * 0.8 * 0.95 * others / others.sum()
+            # Make sure destination is different from start
+            row[start_floor] = 0.0
+
+        cdf = np.cumsum(weights, axis=1)
+        totals = cdf[:, -1:]
+        np.divide(cdf, totals, out=cdf, where=totals > 0)
+        return cdf
+
     def get_destination_floor(self, start_floor: int) -> int:
         """Get a realistic destination floor based on start floor and patterns."""
-        num_floors = self.elevator_system.num_floors
+        return int(
+            np.searchsorted(
+                self.destination_cdf[start_floor], self._rng.random(), side="right"
+            )
+        )
 
-        # Probability distributions for different scenarios
-        if start_floor == self.lobby_floor:
-            # From lobby, people usually go to their apartments
-            # Small chance of going to amenity floor or rooftop
-            if random.random() < 0.15:
-                return self.amenity_floor
-            elif random.random() < 0.05:
-                return self.rooftop_floor
-            else:
-                # Distribute evenly among residential floors (3-24)
-                return random.randint(3, num_floors - 1)
+    def get_destination_floors(self, start_floors: np.ndarray) -> np.ndarray:
+        """Get destination floors for an array of start floors."""
+        u = self._rng.random(len(start_floors))
+        return (self.destination_cdf[start_floors] <= u[:, None]).sum(axis=1)
 
-        elif start_floor == self.amenity_floor:
-            # From amenity floor, people usually go to lobby or their apartments
-            if random.random() < 0.4:
-                return self.lobby_floor
-            else:
-                # Distribute among residential floors (3-24)
-                return random.randint(3, num_floors - 1)
-
-        elif start_floor == self.rooftop_floor:
-            # From rooftop, higher chance of going to lobby
-            if random.random() < 0.6:
-                return self.lobby_floor
-            elif random.random() < 0.2:
-                return self.amenity_floor
-            else:
-                # Distribute among residential floors (3-24)
-                return random.randint(3, num_floors - 1)
+    async def generate_passengers(self, rate: float = 1.0, window: float = 1.0) -> None:
+        """Generate passengers based on time of day and floor patterns.
 
-        else:
-            # From residential floors, usually go to lobby or amenities
-            if random.random() < 0.7:
-                return self.lobby_floor
-            elif random.random() < 0.2:
-                return self.amenity_floor
-            elif random.random() < 0.05:
-                return self.rooftop_floor
-            else:
-                # Occasionally go to another residential floor
-                dest = random.randint(3, num_floors - 1)
-                # Make sure it's not the same floor
-                while dest == start_floor:
-                    dest = random.randint(3, num_floors - 1)
-                return dest
-
-    async def generate_passengers(self, rate: float = 1.0) -> None:
-        """Generate passengers based on time of day and floor patterns."""
+        Arrivals are drawn as a batch once every window seconds.
+        """
         self.running = True
 
         try:
@@ -650,22 +1144,31 @@ class PassengerGenerator:
                 adjusted_rate = rate * time_factor
 
                 # Poisson process for passenger arrival
-                if random.random() < adjusted_rate * self.time_scale * 0.1:
-                    # Choose a random floor for the passenger to start
-                    start_floor = random.randint(1, self.elevator_system.num_floors)
-
-                    # Get a realistic destination based on start floor
-                    destination_floor = self.get_destination_floor(start_floor)
-
-                    # Make sure destination is different from start
-                    while destination_floor == start_floor:
-                        destination_floor = self.get_destination_floor(start_floor)
-
-                    # Add the passenger to the system
-                    self.elevator_system.add_passenger(start_floor, destination_floor)
+                count = self._rng.poisson(adjusted_rate * self.time_scale * window)
+                if count:
+                    # Choose random start floors and realistic destinations
+                    start_floors = self._rng.integers(
+                        1, self.elevator_system.num_floors + 1, size=count
+                    )
+                    destination_floors = self.get_destination_floors(start_floors)
+
+                    # Add the passengers to the system, on a worker thread as
+                    # a step in progress holds the lock. As in run_simulation,
+                    # on cancellation wait for the thread to finish.
+                    future = asyncio.get_running_loop().run_in_executor(
+                        None,
+                        self.elevator_system.add_passengers,
+                        start_floors.tolist(),
+                        destination_floors.tolist(),
+                    )
+                    try:
+                        await asyncio.shield(future)
+                    except asyncio.CancelledError:
+                        await asyncio.wait([future])
+                        raise
 
                 # Sleep to control generation rate
-                await asyncio.sleep(0.1)
+                await asyncio.sleep(window)
 
         except Exception as e:
             print(f"Error in passenger generation: {e}")
@@ -0,0 +1,91 @@
+"""Tests for the WebSocket connection manager."""
+
+import asyncio
+import copy
+import unittest
+
+import orjson
+
+from main import CLIENT_QUEUE_SIZE, ConnectionManager
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.query_params = {"format": "json"}
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.sent.append(orjson.loads(text))
+
+
+def make_state(floor):
+    return {
+        "elevators": [{"id": 0, "current_floor": floor}],
+        "current_time": 0.0,
+    }
+
+
+class ConnectionManagerTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.manager = ConnectionManager()
+        self.websocket = FakeWebSocket()
+        await self.manager.connect(self.websocket)
+
+    async def asyncTearDown(self):
+        self.manager.disconnect(self.websocket)
+
+    async def flush(self):
+        while not self.manager.queues[self.websocket].empty():
+            await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+    async def test_snapshot_newer_than_last_broadcast(self):
+        # The client's snapshot is newer than the state the next delta is
+        # computed against, and the next state reverts to the older value
+        old, newer = make_state(1.0), make_state(2.0)
+        self.manager.broadcast_state(old)
+        await self.flush()
+        self.manager.send_state(self.websocket, newer)
+        self.manager.broadcast_state(copy.deepcopy(old))
+        await self.flush()
+
+        last = self.websocket.sent[-1]
+        self.assertEqual(last["type"], "state_update")
+        self.assertEqual(last["data"], old)
+
+    async def test_deltas_follow_snapshot(self):
+        self.manager.broadcast_state(make_state(1.0))
+        self.manager.broadcast_state(make_state(2.0))
+        await self.flush()
+
+        self.assertEqual(
+            [message["type"] for message in self.websocket.sent],
+            ["state_update", "state_delta"],
+        )
+        self.assertEqual(
+            self.websocket.sent[-1]["data"],
+            {"elevators": {"0": {"id": 0, "current_floor": 2.0}}},
+        )
+
+    async def test_falling_behind_keeps_command_replies(self):
+        # Without yielding to the writer, the queue overflows with deltas
+        self.manager.broadcast_state(make_state(0.0))
+        self.manager.send(self.websocket, {"type": "passenger_added", "data": {}})
+        for floor in range(1, 2 * CLIENT_QUEUE_SIZE):
+            self.manager.broadcast_state(make_state(float(floor)))
+        self.manager.send(self.websocket, {"type": "error", "data": {}})
+        self.manager.broadcast_state(make_state(-1.0))
+        await self.flush()
+
+        types = [message["type"] for message in self.websocket.sent]
+        self.assertEqual(types.count("passenger_added"), 1)
+        self.assertEqual(types.count("error"), 1)
+        self.assertEqual(types[-1], "state_update")
+        self.assertEqual(self.websocket.sent[-1]["data"], make_state(-1.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
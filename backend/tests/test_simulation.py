@@ -0,0 +1,221 @@
+"""Tests for elevator targeting, the event log and the destination tables."""
+
+import unittest
+
+import numpy as np
+
+from simulation.elevator_simulation import (
+    Direction,
+    Elevator,
+    ElevatorSystem,
+    EventLog,
+    PassengerGenerator,
+)
+
+
+def make_elevator(floor, direction, targets):
+    elevator = Elevator(id=0, current_floor=floor)
+    elevator.direction = direction
+    for target in targets:
+        elevator.target_mask |= 1 << target
+    return elevator
+
+
+class NextFloorTest(unittest.TestCase):
+    def check(self, floor, direction, targets, expected):
+        elevator = make_elevator(floor, direction, targets)
+        self.assertEqual(elevator.next_floor, expected, (floor, direction, targets))
+
+    def test_no_targets(self):
+        for direction in Direction:
+            self.check(3, direction, [], None)
+
+    def test_up(self):
+        self.check(3, Direction.UP, [2, 5, 8], 5)
+        self.check(5, Direction.UP, [2, 5, 8], 8)
+        # Nothing above: the highest target
+        self.check(9, Direction.UP, [2, 5], 5)
+        # Between floors, targets above the floor just passed count
+        self.check(3.5, Direction.UP, [3, 4], 4)
+
+    def test_down(self):
+        self.check(6, Direction.DOWN, [2, 4, 8], 4)
+        self.check(4, Direction.DOWN, [2, 4, 8], 2)
+        # Nothing below: the lowest target
+        self.check(1, Direction.DOWN, [4, 8], 4)
+        self.check(4.5, Direction.DOWN, [3, 6], 3)
+
+    def test_idle_closest(self):
+        self.check(5, Direction.IDLE, [5, 7], 5)
+        self.check(5, Direction.IDLE, [2, 6], 6)
+        self.check(5, Direction.IDLE, [4, 8], 4)
+        self.check(2, Direction.IDLE, [7], 7)
+        self.check(9, Direction.IDLE, [7], 7)
+        self.check(4.75, Direction.IDLE, [3, 6], 6)
+        self.check(4.25, Direction.IDLE, [3, 6], 3)
+
+    def test_idle_tie_prefers_lower_floor(self):
+        self.check(5, Direction.IDLE, [3, 7], 3)
+        self.check(4.5, Direction.IDLE, [3, 6], 3)
+
+
+class UpdateDirectionTest(unittest.TestCase):
+    def check(self, direction, targets, expected):
+        elevator = make_elevator(5, direction, targets)
+        elevator.update_direction()
+        self.assertEqual(elevator.direction, expected)
+
+    def test_no_targets(self):
+        self.check(Direction.UP, [], Direction.IDLE)
+
+    def test_toward_next_target(self):
+        self.check(Direction.UP, [5, 8], Direction.UP)
+        self.check(Direction.DOWN, [3, 5], Direction.DOWN)
+        self.check(Direction.IDLE, [2], Direction.DOWN)
+
+    def test_at_target_floor_reverses_when_nothing_ahead(self):
+        self.check(Direction.UP, [3, 5], Direction.DOWN)
+        self.check(Direction.DOWN, [5, 8], Direction.UP)
+
+    def test_at_only_target_floor(self):
+        self.check(Direction.UP, [5], Direction.DOWN)
+        self.check(Direction.DOWN, [5], Direction.UP)
+
+
+class NextFloorCacheTest(unittest.TestCase):
+    def test_add_target_floor(self):
+        elevator = Elevator(id=0, current_floor=1.0)
+        elevator.add_target_floor(6)
+        self.assertEqual(elevator.direction, Direction.UP)
+        self.assertEqual(elevator.next_floor, 6)
+        elevator.add_target_floor(3)
+        self.assertEqual(elevator.next_floor, 3)
+
+    def test_remove_target_floor(self):
+        elevator = make_elevator(1, Direction.UP, [3, 6])
+        self.assertEqual(elevator.next_floor, 3)
+        elevator.remove_target_floor(3)
+        self.assertEqual(elevator.next_floor, 6)
+
+    def test_direction_change(self):
+        elevator = make_elevator(5, Direction.UP, [2, 8])
+        self.assertEqual(elevator.next_floor, 8)
+        elevator.direction = Direction.DOWN
+        self.assertEqual(elevator.next_floor, 2)
+
+    def test_update_direction(self):
+        elevator = make_elevator(5, Direction.UP, [3, 5])
+        self.assertEqual(elevator.next_floor, 5)
+        elevator.update_direction()
+        self.assertEqual(elevator.direction, Direction.DOWN)
+        self.assertEqual(elevator.next_floor, 3)
+
+    def test_movement_step(self):
+        system = ElevatorSystem(num_elevators=1, num_floors=10)
+        elevator = system.elevators[0]
+        elevator.current_floor = 2.8
+        elevator.direction = Direction.UP
+        elevator.destination_floor = 3
+        elevator.target_mask = (1 << 3) | (1 << 6)
+        self.assertEqual(elevator.next_floor, 3)
+
+        arrived = system._move_elevators([elevator], 1.0)
+        self.assertEqual(arrived, [elevator])
+        self.assertEqual(elevator.current_floor, 3.0)
+        self.assertEqual(elevator.next_floor, 6)
+
+
+def idle_ids(events):
+    return [event["elevator_id"] for event in events]
+
+
+class EventLogTest(unittest.TestCase):
+    def setUp(self):
+        # Six events into four slots: the two oldest are overwritten
+        self.log = EventLog(size=4)
+        for i in range(6):
+            self.log.append(float(i), "elevator_idle", (i, i + 1))
+
+    def test_keeps_newest_events_in_order(self):
+        self.assertEqual(len(self.log), 4)
+        self.assertEqual(idle_ids(self.log), [2, 3, 4, 5])
+        self.assertEqual(
+            self.log[0],
+            {"time": 2.0, "type": "elevator_idle", "elevator_id": 2, "floor": 3},
+        )
+
+    def test_indexing_wraps_around(self):
+        self.assertEqual(self.log[-1]["elevator_id"], 5)
+        self.assertEqual(self.log[-4]["elevator_id"], 2)
+        with self.assertRaises(IndexError):
+            self.log[4]
+        with self.assertRaises(IndexError):
+            self.log[-5]
+
+    def test_recent_skip_and_limit(self):
+        self.assertEqual(idle_ids(self.log.recent()), [5, 4, 3, 2])
+        self.assertEqual(idle_ids(self.log.recent(0, 2)), [5, 4])
+        self.assertEqual(idle_ids(self.log.recent(1, 2)), [4, 3])
+        self.assertEqual(idle_ids(self.log.recent(3, 10)), [2])
+        self.assertEqual(self.log.recent(4, 10), [])
+        self.assertEqual(self.log.recent(0, 0), [])
+        self.assertEqual(idle_ids(self.log.recent(-1, 1)), [5])
+
+    def test_events_of_different_types(self):
+        log = EventLog(size=2)
+        log.append(1.5, "passenger_arrived", (7, 2, 9, 1.0, 2.0, 3.0))
+        log.append(2.5, "passengers_boarded", (1, 4, 2, [3, 8]))
+        log.append(3.5, "button_press", (6, "down"))
+        self.assertEqual(
+            list(log),
+            [
+                {
+                    "time": 2.5,
+                    "type": "passengers_boarded",
+                    "elevator_id": 1,
+                    "floor": 4,
+                    "passenger_count": 2,
+                    "passenger_ids": [3, 8],
+                },
+                {"time": 3.5, "type": "button_press", "floor": 6, "direction": "down"},
+            ],
+        )
+
+
+class DestinationTableTest(unittest.TestCase):
+    def check_table(self, num_floors):
+        system = ElevatorSystem(num_floors=num_floors)
+        cdf = PassengerGenerator(system, seed=0).destination_cdf
+        self.assertEqual(cdf.shape, (num_floors + 1, num_floors + 1))
+
+        for start_floor in range(1, num_floors + 1):
+            row = cdf[start_floor]
+            probabilities = np.diff(row, prepend=0.0)
+            self.assertAlmostEqual(row[-1], 1.0)
+            self.assertTrue((probabilities >= 0).all())
+            # Floor 0 does not exist and the start floor is never a destination
+            self.assertEqual(probabilities[0], 0.0)
+            self.assertEqual(probabilities[start_floor], 0.0)
+
+    def test_rows_are_distributions_excluding_start_floor(self):
+        self.check_table(25)
+
+    def test_floors_outside_building_are_ignored(self):
+        # The default rooftop floor (25) is above a 10-floor building
+        self.check_table(10)
+
+    def test_sampled_destinations_differ_from_start(self):
+        system = ElevatorSystem(num_floors=25)
+        generator = PassengerGenerator(system, seed=0)
+        starts = np.repeat(np.arange(1, 26), 200)
+        destinations = generator.get_destination_floors(starts)
+        self.assertTrue(((destinations >= 1) & (destinations <= 25)).all())
+        self.assertTrue((destinations != starts).all())
+        for start_floor in (1, 2, 10, 25):
+            destination = generator.get_destination_floor(start_floor)
+            self.assertNotEqual(destination, start_floor)
+            self.assertTrue(1 <= destination <= 25)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,22 @@
+"""
+Gunicorn Worker for the Elevator Simulation API
+
+Runs the ASGI app under gunicorn with the same uvicorn settings used in
+development, plus WebSocket keepalive pings so idle connections are reaped:
+
+    gunicorn main:app -k worker.ConfigurableWorker --bind 0.0.0.0:8000
+"""
+from uvicorn_worker import UvicornWorker
+
+
+class ConfigurableWorker(UvicornWorker):
+    """Uvicorn worker with uvloop, httptools and WebSocket ping settings."""
+
+    CONFIG_KWARGS = {
+        "loop": "uvloop",
+        "http": "httptools",
+        "ws": "websockets",
+        "ws_ping_interval": 20,
+        "ws_ping_timeout": 60,
+        "limit_concurrency": 1024,
+    }
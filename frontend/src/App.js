@@ -3,7 +3,7 @@ import Building from './components/Building';
 import Controls from './components/Controls';
 import EventStream from './components/EventStream';
 import Statistics from './components/Statistics';
-import { api, createWebSocketClient } from './api/api';
+import { api, applyStateDelta, createWebSocketClient } from './api/api';
 import './App.css';
 
 function App() {
@@ -21,6 +21,8 @@ function App() {
         (data) => {
           if (data.type === 'state_update') {
             setSimulationState(data.data);
+          } else if (data.type === 'state_delta') {
+            setSimulationState((state) => applyStateDelta(state, data.data));
           }
         },
         () => console.log('WebSocket connected'),
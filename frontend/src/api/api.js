@@ -5,6 +5,7 @@
  * and establishes a WebSocket connection for real-time updates.
  */
 import axios from 'axios';
+import { decode } from './msgpack';
 
 // Base API URL - configurable for different environments
 const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000';
@@ -91,6 +92,27 @@ export const api = {
   }
 };
 
+/**
+ * Apply a `state_delta` WebSocket message to the previous simulation state
+ * @param {Object} state - Previous simulation state
+ * @param {Object} delta - Changed fields; `elevators` maps index to elevator
+ * @returns {Object} Updated simulation state
+ */
+export const applyStateDelta = (state, delta) => {
+  if (!state) return state;
+
+  const { elevators, ...fields } = delta;
+  const nextState = { ...state, ...fields };
+
+  if (elevators) {
+    nextState.elevators = state.elevators.map(
+      (elevator, index) => elevators[index] || elevator
+    );
+  }
+
+  return nextState;
+};
+
 // Keep track of the active WebSocket connection
 let activeWebSocket = null;
 
@@ -117,6 +139,8 @@ export const createWebSocketClient = (onMessage, onConnect, onDisconnect) => {
   
   console.log('Creating new WebSocket connection');
   const ws = new WebSocket(`${WS_BASE_URL}/ws`);
+  // The server sends MessagePack binary frames (or JSON text with ?format=json)
+  ws.binaryType = 'arraybuffer';
   
   ws.onopen = () => {
     console.log('WebSocket connection established');
@@ -125,7 +149,9 @@ export const createWebSocketClient = (onMessage, onConnect, onDisconnect) => {
   
   ws.onmessage = (event) => {
     try {
-      const data = JSON.parse(event.data);
+      const data = typeof event.data === 'string'
+        ? JSON.parse(event.data)
+        : decode(new Uint8Array(event.data));
       if (onMessage) onMessage(data);
     } catch (error) {
       console.error('Error parsing WebSocket message:', error);